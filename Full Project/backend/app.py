@@ -1,56 +1,290 @@
 # app.py
 import os
+
+# Size the OpenMP / MKL pools before torch and faiss are imported and spin them up
+NUM_THREADS = int(os.getenv("NUM_THREADS", os.cpu_count() or 1))
+os.environ.setdefault("OMP_NUM_THREADS", str(NUM_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(NUM_THREADS))
+
+import sys
+import ctypes
+import ctypes.util
 import json
+import re
 import pickle
+import hashlib
+import queue
+import threading
+import time
+import functools
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from dotenv import load_dotenv
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
+import orjson
 from flask_cors import CORS
 from sentence_transformers import SentenceTransformer
+import torch
 import faiss
 import numpy as np
+import pyarrow as pa
 from deep_translator import GoogleTranslator
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from ibm_watsonx_ai import Credentials
 from ibm_watsonx_ai.foundation_models import ModelInference
 
+try:
+    import onnxruntime as ort
+    from transformers import AutoTokenizer
+except ImportError:
+    ort = None
+
+try:
+    import fasttext
+except ImportError:
+    fasttext = None
+
 # -------------------- Setup --------------------
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson (used by request.json and jsonify)."""
+
+    OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=self.OPTIONS), mimetype="application/json")
+
 load_dotenv()
+# One process owns the compute pools; request threads shouldn't oversubscribe them
+torch.set_num_threads(NUM_THREADS)
+torch.set_num_interop_threads(1)
+faiss.omp_set_num_threads(NUM_THREADS)
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)   # ✅ Allow requests from frontend
 
 FAISS_DIR = "data/faiss_index"
 EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_DIR = "data/onnx_model"
+ONNX_MODEL_FILE = "model_quantized.onnx"
 TOP_K = 3
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 8
+FAISS_MLOCK = os.getenv("FAISS_MLOCK", "0") == "1"
+PREFAULT_BLOCK = 65536
+MAX_BATCH = 32
+BATCH_WINDOW_S = 0.01
+RETRIEVAL_TIMEOUT_S = 10
+OUTBREAK_TIMEOUT_S = 5
+EMBED_DIM = 384
+REPLY_CACHE_SIZE = 1000
+SEMANTIC_CACHE_SIZE = 1000
+SEMANTIC_CACHE_THRESHOLD = 0.92
+DEDUP_THRESHOLD = 0.9
+NO_CONTEXT_REPLY = "Sorry, I couldn't find a specific answer in the knowledge base."
+
+SUPPORTED_LANGS = ["en", "hi", "te", "kn"]
+LID_MODEL_PATH = os.getenv("LID_MODEL_PATH", "data/lid.176.ftz")
+LID_SKIP_CONFIDENCE = 0.9   # local "en" this sure skips translating an explicitly non-English query
+TRANSLATION_CACHE_SIZE = 4096
 
 # WatsonX configuration
 WATSONX_API_KEY = os.getenv("WATSONX_API_KEY")
 WATSONX_URL = os.getenv("WATSONX_URL")      # e.g. https://us-south.ml.cloud.ibm.com
 WATSONX_PROJECT_ID = os.getenv("WATSONX_PROJECT_ID")
 
+# Side requests (e.g. outbreak numbers) run alongside answer generation
+OUTBOUND_POOL = ThreadPoolExecutor(max_workers=4)
+
+# Shared keep-alive connection pool for outbound HTTP calls
+HTTP = requests.Session()
+HTTP.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, read=0, backoff_factor=0.1),   # never resend after a read timeout
+))
+
 # Translator
 translator = GoogleTranslator()
 
 # -------------------- Embedding Model & FAISS --------------------
+class OnnxEmbedder:
+    """Drop-in replacement for SentenceTransformer.encode backed by ONNX Runtime."""
+
+    def __init__(self, model_dir, max_length=256):
+        # Exported offline by build_index.py; the server never exports at import
+        model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"{model_path} missing, run build_index.py")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_length = max_length
+        so = ort.SessionOptions()
+        so.intra_op_num_threads = NUM_THREADS
+        self.session = ort.InferenceSession(
+            model_path, sess_options=so, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _forward(self, sentences):
+        # A single query needs no padding; batches are padded to their longest member
+        tokens = self.tokenizer(
+            sentences,
+            padding=len(sentences) > 1,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np",
+        )
+        feed = {k: v.astype(np.int64) for k, v in tokens.items() if k in self.input_names}
+        hidden = self.session.run(None, feed)[0]
+        # Attention-mask mean pooling, as in the sentence-transformers pooling layer
+        mask = tokens["attention_mask"][..., None].astype(np.float32)
+        summed = (hidden * mask).sum(axis=1)
+        return summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True,
+               normalize_embeddings=False, **kwargs):
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        chunks = [
+            self._forward(sentences[i:i + batch_size])
+            for i in range(0, len(sentences), batch_size)
+        ]
+        emb = np.ascontiguousarray(np.vstack(chunks), dtype=np.float32)
+        if normalize_embeddings:
+            faiss.normalize_L2(emb)
+        return emb
+
+
 print("Loading embedding model...")
-embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+embed_model = None
+if ort is not None:
+    try:
+        embed_model = OnnxEmbedder(ONNX_DIR)
+        print("✅ ONNX Runtime INT8 embedding model loaded.")
+    except Exception as e:
+        print("⚠️ ONNX embedding model initialization failed:", e)
+if embed_model is None:
+    embed_model = SentenceTransformer(EMBED_MODEL_NAME)
+
+def configure_search(index):
+    """Apply query-time ANN parameters (no-op for flat indexes)."""
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif hasattr(index, "nprobe"):
+        index.nprobe = IVF_NPROBE
+    return index
+
+def index_to_gpu(cpu_index):
+    """Clone the index onto GPU 0 (FP16 storage) when CUDA FAISS is available."""
+    if not hasattr(faiss, "StandardGpuResources") or faiss.get_num_gpus() == 0:
+        return cpu_index
+    if hasattr(cpu_index, "hnsw"):   # HNSW has no GPU implementation
+        return cpu_index
+    try:
+        res = faiss.StandardGpuResources()
+        co = faiss.GpuClonerOptions()
+        co.useFloat16 = True
+        gpu_index = faiss.index_cpu_to_gpu(res, 0, cpu_index, co)
+        print("✅ FAISS index moved to GPU.")
+        return gpu_index
+    except Exception as e:
+        print("⚠️ FAISS GPU transfer failed, staying on CPU:", e)
+        return cpu_index
+
+def lock_memory():
+    """Pin all mapped pages in RAM (Linux; needs CAP_IPC_LOCK or a large RLIMIT_MEMLOCK)."""
+    if not sys.platform.startswith("linux"):
+        return
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    MCL_CURRENT = 1
+    if libc.mlockall(MCL_CURRENT) != 0:
+        err = ctypes.get_errno()
+        print("⚠️ mlockall failed:", os.strerror(err))
+    else:
+        print("✅ Process memory locked in RAM.")
+
+def prefault_index(cpu_index):
+    """Read every vector (and HNSW graph link) once so mapped pages are resident."""
+    try:
+        ivf = faiss.try_extract_index_ivf(cpu_index)
+        if ivf is not None:
+            ivf.make_direct_map()   # IVF needs it for reconstruct_n
+        for i0 in range(0, cpu_index.ntotal, PREFAULT_BLOCK):
+            cpu_index.reconstruct_n(i0, min(PREFAULT_BLOCK, cpu_index.ntotal - i0))
+        if hasattr(cpu_index, "hnsw"):
+            faiss.vector_to_array(cpu_index.hnsw.neighbors)
+    except Exception as e:
+        print("⚠️ FAISS index prefault failed:", e)
+
+def load_index(path):
+    """Read the index memory-mapped where FAISS supports it, apply search params
+    and fault all of its pages in before the first query.
+
+    Returns (cpu_index, search_index); they differ only when the index went to GPU."""
+    # IO_FLAG_MMAP maps IVF inverted lists, IO_FLAG_MMAP_IFC (newer FAISS) flat / HNSW
+    # code storage; IVF indexes reject the IFC flag, so fall back one step at a time
+    mmap = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    attempts = [("MMAP", mmap)]
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        attempts.insert(0, ("MMAP_IFC", mmap | faiss.IO_FLAG_MMAP_IFC))
+    cpu_index = None
+    for name, flags in attempts:
+        try:
+            cpu_index = faiss.read_index(path, flags)
+            print(f"✅ FAISS index memory-mapped ({name}).")
+            break
+        except Exception as e:
+            print(f"⚠️ FAISS {name} read failed, falling back:", e)
+    if cpu_index is None:
+        print("⚠️ FAISS index not memory-mappable, reading it fully into RAM.")
+        cpu_index = faiss.read_index(path)
+    prefault_index(configure_search(cpu_index))
+    idx = index_to_gpu(cpu_index)
+    # Warm-up search (also initializes GPU kernels when the index was moved there)
+    idx.search(np.zeros((1, idx.d), dtype=np.float32), 1)
+    if FAISS_MLOCK:
+        lock_memory()
+    return cpu_index, idx
+
+CORPUS_SCHEMA = pa.schema([("text", pa.string()), ("source", pa.string()), ("part", pa.int64())])
+
+def load_corpus(faiss_dir):
+    """Chunk texts + metadata as an Arrow table, memory-mapped when texts.arrow exists."""
+    arrow_path = os.path.join(faiss_dir, "texts.arrow")
+    if os.path.exists(arrow_path):
+        return pa.ipc.open_file(pa.memory_map(arrow_path, "r")).read_all()
+    # Older build_index.py runs wrote pickled lists
+    with open(os.path.join(faiss_dir, "texts.pkl"), "rb") as f:
+        texts = pickle.load(f)
+    with open(os.path.join(faiss_dir, "metas.pkl"), "rb") as f:
+        metas = pickle.load(f)
+    return pa.table({
+        "text": texts,
+        "source": [m["source"] for m in metas],
+        "part": [m["part"] for m in metas],
+    }, schema=CORPUS_SCHEMA)
 
 # Load FAISS index and data (with error handling)
 index = None
-texts = []
-metas = []
+cpu_index = None
+corpus = CORPUS_SCHEMA.empty_table()
 
 try:
     faiss_index_path = os.path.join(FAISS_DIR, "faiss.index")
-    texts_path = os.path.join(FAISS_DIR, "texts.pkl")
-    metas_path = os.path.join(FAISS_DIR, "metas.pkl")
     
     if os.path.exists(faiss_index_path):
         print("Loading FAISS index and texts...")
-        index = faiss.read_index(faiss_index_path)
-        with open(texts_path, "rb") as f:
-            texts = pickle.load(f)
-        with open(metas_path, "rb") as f:
-            metas = pickle.load(f)
+        cpu_index, index = load_index(faiss_index_path)
+        corpus = load_corpus(FAISS_DIR)
         print("✅ FAISS index loaded successfully.")
     else:
         print("⚠️ FAISS index not found. Context retrieval will be disabled.")
@@ -61,34 +295,213 @@ except Exception as e:
     print("   Context retrieval will be disabled.")
 
 # -------------------- Utilities --------------------
-def detect_language(text):
+# Local fastText language ID keeps detection off the network
+lid_model = None
+if fasttext is not None and os.path.exists(LID_MODEL_PATH):
     try:
+        lid_model = fasttext.load_model(LID_MODEL_PATH)
+    except Exception as e:
+        print("⚠️ fastText language ID model failed to load:", e)
+
+def detect_language(text, min_confidence=0.0):
+    """Language code of text, or None if detection failed or (locally) was less sure than min_confidence."""
+    try:
+        if lid_model is not None:
+            # List input: the single-string path uses np.array(copy=False), which numpy 2 rejects
+            labels, probs = lid_model.predict([text.replace("\n", " ")], k=1)
+            if probs[0][0] < min_confidence:
+                return None
+            return labels[0][0].removeprefix("__label__")
         return translator.detect(text).lang
-    except Exception:
-        return "en"
+    except Exception as e:
+        print("Language detection error:", e)
+        return None
 
-def translate(text, dest):
+@functools.lru_cache(maxsize=TRANSLATION_CACHE_SIZE)
+def _translate_remote(text, dest):
+    # Exceptions are not cached, so failed lookups are retried next time
+    return GoogleTranslator(source="auto", target=dest).translate(text)
+
+def translate(text, dest, source="auto"):
+    if source == dest:
+        return text
+    canned = CANNED_TRANSLATIONS.get(dest, {}).get(text)
+    if canned is not None:
+        return canned
     try:
-        return GoogleTranslator(source="auto", target=dest).translate(text)
+        return _translate_remote(text, dest)
     except Exception:
         return text
 
+# Fixed phrases the bot sends verbatim, translated once per language at startup
+CANNED_PHRASES = [
+    "If severe symptoms, go to nearest PHC immediately.",
+    "Sorry, I couldn't generate a complete answer.",
+    "Sorry, there was an issue generating the answer.",
+    "Sorry, I couldn't find a specific answer in the knowledge base.",
+    "Sorry, an error occurred while generating an answer.",
+]
+CANNED_TRANSLATIONS = {lang: {} for lang in SUPPORTED_LANGS if lang != "en"}
+
+def precompute_canned_translations():
+    for lang, table in CANNED_TRANSLATIONS.items():
+        for phrase in CANNED_PHRASES:
+            try:
+                table[phrase] = _translate_remote(phrase, lang)
+            except Exception:
+                pass   # left to the live path
+
+# Background thread so an unreachable translator doesn't stall startup
+threading.Thread(target=precompute_canned_translations, daemon=True).start()
+
 # -------------------- Retrieval --------------------
+class RetrievalBatcher:
+    """Coalesce concurrent queries into one encode + one index.search call."""
+
+    def __init__(self, max_batch=MAX_BATCH, window=BATCH_WINDOW_S):
+        self.max_batch = max_batch
+        self.window = window
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        # Started lazily (and per process) so forking servers get a live worker
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, args=(self._queue,), daemon=True).start()
+                self._pid = os.getpid()
+
+    def search(self, query, k, timeout=RETRIEVAL_TIMEOUT_S):
+        """Return (query_embedding, scores, ids) for a single query."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((query, k, future))
+        return future.result(timeout=timeout)
+
+    def _run(self, q):
+        while True:
+            batch = [q.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch):
+        try:
+            q_emb = embed_model.encode(
+                [item[0] for item in batch],
+                batch_size=self.max_batch,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+            D, I = index.search(q_emb, max(item[1] for item in batch))
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for row, (_, k, future) in enumerate(batch):
+            future.set_result((q_emb[row], D[row, :k], I[row, :k]))
+
+
+retrieval_batcher = RetrievalBatcher()
+
+def drop_near_duplicates(ids):
+    """Greedily keep hits (best first) that aren't near-copies of an already kept one."""
+    # Decode just the k hits from the (FP16) codes; prefault_index built the IVF direct map
+    try:
+        emb = cpu_index.reconstruct_batch(ids)
+    except Exception as e:
+        print("⚠️ Hit vectors not reconstructable, duplicate filtering skipped:", e)
+        return ids
+    keep = [0]
+    for j in range(1, len(ids)):
+        if np.max(emb[keep] @ emb[j]) < DEDUP_THRESHOLD:
+            keep.append(j)
+    return ids[keep]
+
 def retrieve_context(query, k=TOP_K):
-    if index is None or len(texts) == 0:
-        return []
+    """Return the query embedding (None if retrieval is disabled) and the top-k chunks as an Arrow table."""
+    if index is None or corpus.num_rows == 0:
+        return None, corpus.slice(0, 0)
     try:
-        q_emb = embed_model.encode([query], convert_to_numpy=True)
-        faiss.normalize_L2(q_emb)
-        D, I = index.search(q_emb, k)
-        results = []
-        for idx in I[0]:
-            if idx < len(texts):
-                results.append({"text": texts[idx], "meta": metas[idx]})
-        return results
+        q_emb, D, I = retrieval_batcher.search(query, k)
+        ids = I[(I >= 0) & (I < corpus.num_rows)]   # FAISS pads missing hits with -1
+        if len(ids) > 1:
+            ids = drop_near_duplicates(ids)
+        return q_emb, corpus.take(ids)
     except Exception as e:
         print(f"Error in retrieve_context: {e}")
-        return []
+        return None, corpus.slice(0, 0)
+
+# -------------------- Response Cache --------------------
+class ReplyCache:
+    """Thread-safe LRU of final replies keyed on the normalized (query, lang)."""
+
+    def __init__(self, maxsize=REPLY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(q_en, lang):
+        return hashlib.blake2b(f"{lang}:{q_en.lower().strip()}".encode()).hexdigest()
+
+    def get(self, q_en, lang):
+        key = self._key(q_en, lang)
+        with self._lock:
+            reply = self._data.get(key)
+            if reply is not None:
+                self._data.move_to_end(key)
+            return reply
+
+    def put(self, q_en, lang, reply):
+        key = self._key(q_en, lang)
+        with self._lock:
+            self._data[key] = reply
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+class SemanticCache:
+    """English answers of past queries, looked up by query-embedding similarity."""
+
+    def __init__(self, d=EMBED_DIM, maxsize=SEMANTIC_CACHE_SIZE, threshold=SEMANTIC_CACHE_THRESHOLD):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.index = faiss.IndexFlatIP(d)
+        self.answers = []
+        self._lock = threading.Lock()
+
+    def get(self, q_emb):
+        with self._lock:
+            if self.index.ntotal == 0:
+                return None
+            D, I = self.index.search(q_emb.reshape(1, -1), 1)
+            if D[0][0] > self.threshold:
+                return self.answers[I[0][0]]
+        return None
+
+    def put(self, q_emb, answer):
+        with self._lock:
+            if self.index.ntotal >= self.maxsize:
+                # Evict the oldest entry; ids shift down like the answers list
+                self.index.remove_ids(np.array([0], dtype=np.int64))
+                self.answers.pop(0)
+            self.index.add(np.ascontiguousarray(q_emb.reshape(1, -1), dtype=np.float32))
+            self.answers.append(answer)
+
+
+reply_cache = ReplyCache()
+semantic_cache = SemanticCache()
 
 # -------------------- WatsonX Model --------------------
 watsonx_model = None
@@ -110,6 +523,8 @@ else:
     print("⚠️ WatsonX credentials missing — using fallback generator.")
 
 # -------------------- Generation --------------------
+_WS_RE = re.compile(r"\s+")
+
 def watsonx_generate(prompt):
     """Use WatsonX Granite model if available; else fallback."""
     if watsonx_model:
@@ -134,7 +549,7 @@ def watsonx_generate(prompt):
                 text = str(response)
 
             # Cleanup for truncated artifacts
-            text = text.replace("\n\n", " ").replace("  ", " ")
+            text = _WS_RE.sub(" ", text).strip()
             if not text.endswith(('.', '!', '?')):
                 text += "."
 
@@ -164,6 +579,39 @@ def fallback_generate(prompt):
     except Exception:
         return "Sorry, an error occurred while generating an answer."
 
+# -------------------- Cached Generation --------------------
+def generate_answer(q_emb, prompt):
+    """Semantic-cache lookup, then WatsonX / fallback generation on a miss."""
+    if prompt is None:   # nothing retrieved: no point paying for a model round trip
+        return NO_CONTEXT_REPLY
+    answer = semantic_cache.get(q_emb) if q_emb is not None else None
+    if answer is None:
+        answer = watsonx_generate(prompt)
+        if q_emb is not None and not answer.startswith("Sorry"):   # don't cache errors / misses
+            semantic_cache.put(q_emb, answer)
+    return answer
+
+# -------------------- Outbreak Data --------------------
+def fetch_outbreak_note():
+    try:
+        j = HTTP.get("https://disease.sh/v3/covid-19/all", timeout=OUTBREAK_TIMEOUT_S).json()
+        return f"\n\nNote: Global active COVID cases (approx): {j.get('active', 'N/A')}"
+    except Exception:
+        return ""
+
+def outbreak_note_result(note):
+    """Wait a bounded time for the side lookup; a late note is dropped, not waited on."""
+    try:
+        return note.result(timeout=OUTBREAK_TIMEOUT_S)
+    except FutureTimeout:
+        return ""
+
+# -------------------- Prompt --------------------
+PROMPT_SUFFIX = (
+    "\nAnswer briefly and clearly for a rural audience in simple language. "
+    "If emergency, say 'If severe symptoms, go to nearest PHC immediately.'"
+)
+
 # -------------------- Flask Endpoint --------------------
 @app.route("/chat", methods=["POST"])
 def chat():
@@ -174,31 +622,40 @@ def chat():
     if not user_text:
         return jsonify({"error": "query required"}), 400
 
-    detected = detect_language(user_text) if user_lang == "auto" else user_lang
-    target_code = detected if detected in ["en", "hi", "te", "kn"] else "en"
+    detected = (detect_language(user_text) or "en") if user_lang == "auto" else user_lang
+    target_code = detected if detected in SUPPORTED_LANGS else "en"
 
-    q_en = translate(user_text, "en") if target_code != "en" else user_text
-    docs = retrieve_context(q_en, k=TOP_K)
-    context = "\n\n".join([d["text"] for d in docs]) if docs else ""
+    # With local language ID, also skip the inbound round trip when an explicitly
+    # chosen language doesn't match text that is confidently English; a failed or
+    # unsure detection keeps the stated language and translates as before
+    source = detected
+    if user_lang != "auto" and lid_model is not None:
+        if detect_language(user_text, min_confidence=LID_SKIP_CONFIDENCE) == "en":
+            source = "en"
+    q_en = translate(user_text, "en", source=source) if target_code != "en" else user_text
+    cached = reply_cache.get(q_en, target_code)
+    if cached is not None:
+        return jsonify({"reply": cached, "lang": target_code})
 
-    prompt = (
-        f"Context: {context}\n\n"
-        f"Question: {q_en}\n"
-        "Answer briefly and clearly for a rural audience in simple language. "
-        "If emergency, say 'If severe symptoms, go to nearest PHC immediately.'"
-    )
+    q_emb, docs = retrieve_context(q_en, k=TOP_K)
+    context = "\n\n".join(docs["text"].to_pylist())
 
-    answer_en = watsonx_generate(prompt)
+    # Retrieval ran but found nothing: answer directly instead of prompting without context
+    prompt = None if q_emb is not None and not context else "".join(
+        ("Context: ", context, "\n\nQuestion: ", q_en, PROMPT_SUFFIX)
+    )
 
-    # Optional outbreak info
-    try:
-        if any(word in q_en.lower() for word in ["covid", "outbreak", "dengue"]):
-            j = requests.get("https://disease.sh/v3/covid-19/all", timeout=10).json()
-            answer_en += f"\n\nNote: Global active COVID cases (approx): {j.get('active', 'N/A')}"
-    except Exception:
-        pass
+    # Generation and the optional outbreak lookup are independent network calls, so the
+    # lookup runs on the side pool meanwhile (replies carrying live numbers are not cached)
+    outbreak = any(word in q_en.lower() for word in ["covid", "outbreak", "dengue"])
+    note = OUTBOUND_POOL.submit(fetch_outbreak_note) if outbreak else None
+    answer_en = generate_answer(q_emb, prompt)
+    if note is not None:
+        answer_en += outbreak_note_result(note)
 
-    answer_local = translate(answer_en, target_code) if target_code != "en" else answer_en
+    answer_local = translate(answer_en, target_code, source="en")
+    if not outbreak and not answer_en.startswith("Sorry"):
+        reply_cache.put(q_en, target_code, answer_local)
     return jsonify({"reply": answer_local, "lang": target_code})
 
 # -------------------- Health Check Endpoint --------------------
@@ -208,12 +665,13 @@ def health():
         "status": "healthy",
         "watsonx_configured": watsonx_model is not None,
         "faiss_loaded": index is not None,
-        "faiss_texts_count": len(texts)
+        "faiss_texts_count": corpus.num_rows
     })
 
 # -------------------- Run --------------------
+# Development server only; serve production traffic with `gunicorn app:app` (see gunicorn.conf.py)
 if __name__ == "__main__":
     port = int(os.getenv("FLASK_PORT", 5050))
-    app.run(host="0.0.0.0", port=port, debug=True)
+    app.run(host="0.0.0.0", port=port, debug=os.getenv("FLASK_DEBUG") == "1", threaded=True)
 
 
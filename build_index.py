@@ -1,20 +1,40 @@
 # build_index.py
 import os
 import glob
-import pickle
 from sentence_transformers import SentenceTransformer
 import numpy as np
 import faiss
+import pyarrow as pa
+import torch
 from tqdm import tqdm
 
 DOCS_DIR = "docs"
 OUT_DIR = "data/faiss_index"
+ONNX_DIR = "data/onnx_model"
 EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+ENCODE_BATCH_SIZE = 64
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+IVF_MIN_CHUNKS = 100_000   # above this, IVF trains faster and uses less memory than HNSW
+SQ_TYPE = faiss.ScalarQuantizer.QT_fp16   # QT_8bit quarters memory for a small recall loss
 
 os.makedirs(OUT_DIR, exist_ok=True)
 
+def export_quantized_onnx(model_name, out_dir):
+    """Export MiniLM to ONNX and apply INT8 dynamic quantization for the server's query encoder."""
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    ort_model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+    ort_model.save_pretrained(out_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(out_dir)
+    quantizer = ORTQuantizer.from_pretrained(ort_model)
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=out_dir, quantization_config=qconfig)
+
 print("Loading embedding model:", EMBED_MODEL_NAME)
-model = SentenceTransformer(EMBED_MODEL_NAME)
+model = SentenceTransformer(EMBED_MODEL_NAME, device="cuda" if torch.cuda.is_available() else None)
 
 # Read docs
 texts = []
@@ -30,18 +50,47 @@ for fp in glob.glob(os.path.join(DOCS_DIR, "*.txt")):
         metas.append({"source": name, "part": i})
 
 print(f"Encoding {len(texts)} text chunks...")
-embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
+# Smart batching: encode length-sorted chunks so each batch pads to similar lengths,
+# then scatter the rows back to the original order
+order = np.argsort([len(t.split()) for t in texts])
+emb_sorted = model.encode(
+    [texts[i] for i in order],
+    batch_size=ENCODE_BATCH_SIZE,
+    show_progress_bar=True,
+    convert_to_numpy=True,
+    normalize_embeddings=True,   # unit vectors: inner product == cosine
+)
+embeddings = np.empty_like(emb_sorted)
+embeddings[order] = emb_sorted
 
-d = embeddings.shape[1]
-index = faiss.IndexFlatIP(d)  # inner product (we'll normalize)
-faiss.normalize_L2(embeddings)
+n, d = embeddings.shape
+if n > IVF_MIN_CHUNKS:
+    nlist = int(4 * np.sqrt(n))
+    quantizer = faiss.IndexFlatIP(d)
+    index = faiss.IndexIVFScalarQuantizer(quantizer, d, nlist, SQ_TYPE, faiss.METRIC_INNER_PRODUCT)
+else:
+    index = faiss.IndexHNSWSQ(d, SQ_TYPE, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+index.train(embeddings)
 index.add(embeddings)
 
 # Save index and data
 faiss.write_index(index, os.path.join(OUT_DIR, "faiss.index"))
-with open(os.path.join(OUT_DIR, "texts.pkl"), "wb") as f:
-    pickle.dump(texts, f)
-with open(os.path.join(OUT_DIR, "metas.pkl"), "wb") as f:
-    pickle.dump(metas, f)
+# Columnar texts + metadata; the server memory-maps this file instead of unpickling
+table = pa.table({
+    "text": texts,
+    "source": [m["source"] for m in metas],
+    "part": [m["part"] for m in metas],
+}, schema=pa.schema([("text", pa.string()), ("source", pa.string()), ("part", pa.int64())]))
+with pa.OSFile(os.path.join(OUT_DIR, "texts.arrow"), "wb") as sink:
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+print("Index saved to", OUT_DIR)
 
-print("Index saved to", OUT_DIR)
\ No newline at end of file
+print("Exporting INT8 ONNX embedding model...")
+try:
+    export_quantized_onnx(EMBED_MODEL_NAME, ONNX_DIR)
+    print("ONNX model saved to", ONNX_DIR)
+except ImportError as e:
+    print("Skipping ONNX export (optimum not installed):", e)
\ No newline at end of file
@@ -0,0 +1,13 @@
+# gunicorn.conf.py — production server: gunicorn app:app
+import os
+
+bind = f"0.0.0.0:{os.getenv('FLASK_PORT', 5060)}"
+workers = 1            # one process owns the embedding model and the torch/FAISS thread pools
+worker_class = "gthread"
+threads = 16           # request threads mostly wait on translate / WatsonX I/O
+# Worker boot (model load, index prefault, fastText) counts against this too; the
+# ONNX export happens offline in build_index.py so a slow boot can't respawn-loop
+timeout = 120
+# No preload: with a single worker there is nothing to share copy-on-write, and the
+# app's import-time threads, ONNX Runtime pools and CUDA contexts must not cross a fork
+preload_app = False
@@ -1,7 +1,16 @@
 # streamlit_app.py
+import json
 import streamlit as st
 import requests
 
+def stream_reply(resp):
+    """Yield reply text from the backend's Server-Sent Events stream."""
+    for line in resp.iter_lines():
+        if line.startswith(b"data: "):
+            event = json.loads(line[len(b"data: "):])
+            if "chunk" in event:
+                yield event["chunk"] + " "
+
 st.set_page_config(page_title="WatsonHealth RAG Bot", layout="centered")
 st.title("🩺 WatsonHealth RAG Chatbot (Demo)")
 
@@ -13,13 +22,17 @@ query = st.text_area("Ask about symptoms, prevention, vaccines, or outbreaks", h
 if st.button("Send"):
     payload = {"query": query, "lang": lang_choice}
     try:
-        resp = requests.post("http://localhost:5060/chat", json=payload, timeout=15)
-        if resp.status_code == 200:
-            data = resp.json()
-            st.markdown("**Bot reply:**")
-            st.write(data.get("reply", "No reply"))
-        else:
-            st.error(f"Backend error: {resp.status_code} {resp.text}")
+        with requests.post("http://localhost:5060/chat/stream", json=payload, timeout=15, stream=True) as resp:
+            if resp.status_code != 200:
+                st.error(f"Backend error: {resp.status_code} {resp.text}")
+            elif resp.headers.get("Content-Type", "").startswith("text/event-stream"):
+                st.markdown("**Bot reply:**")
+                st.write_stream(stream_reply(resp))
+            else:
+                # Answered without generation (e.g. non-health question): plain JSON
+                data = resp.json()
+                st.markdown("**Bot reply:**")
+                st.write(data.get("reply", "No reply"))
     except Exception as e:
         st.error("Error contacting backend: " + str(e))
 